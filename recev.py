@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import numba
 import io
-import matplotlib.pyplot as plt
+import os
 from datetime import date, datetime
 
 # --------------------------------------------------------------------------------
@@ -17,31 +18,143 @@ st.set_page_config(page_title="Receivables Dashboard", layout="wide")
 def load_data(excel_file: str):
     """
     Reads 'Invoices' & 'Payments' sheets from Excel.
+    Parsed sheets are cached in Parquet files next to the workbook and only
+    re-read from Excel when the workbook is newer than the cache.
     """
-    df_invoices = pd.read_excel(
-        excel_file,
-        sheet_name="Invoices",
-        parse_dates=["Invoice Date", "Due Date"]
-    )
-    df_payments = pd.read_excel(
-        excel_file,
-        sheet_name="Payments",
-        parse_dates=["Payment Date"]
+    inv_parquet = excel_file + ".invoices.parquet"
+    pay_parquet = excel_file + ".payments.parquet"
+    excel_mtime = os.path.getmtime(excel_file)
+
+    df_invoices = df_payments = None
+    if all(
+        os.path.exists(path) and os.path.getmtime(path) >= excel_mtime
+        for path in (inv_parquet, pay_parquet)
+    ):
+        try:
+            df_invoices = pd.read_parquet(inv_parquet, engine="pyarrow")
+            df_payments = pd.read_parquet(pay_parquet, engine="pyarrow")
+        except (OSError, ValueError):
+            # Unreadable cache (e.g. truncated file); rebuild it from the workbook
+            df_invoices = df_payments = None
+
+    if df_invoices is None:
+        df_invoices = pd.read_excel(
+            excel_file,
+            sheet_name="Invoices",
+            parse_dates=["Invoice Date", "Due Date"]
+        )
+        df_payments = pd.read_excel(
+            excel_file,
+            sheet_name="Payments",
+            parse_dates=["Payment Date"]
+        )
+        # Each file is written to a temp path and renamed into place, so an
+        # interrupted write never leaves a truncated cache behind
+        tmp_suffix = f".{os.getpid()}.tmp"
+        try:
+            for df, path in ((df_invoices, inv_parquet), (df_payments, pay_parquet)):
+                df.to_parquet(path + tmp_suffix, engine="pyarrow", compression="zstd", index=False)
+                os.replace(path + tmp_suffix, path)
+        except (OSError, ValueError, TypeError):
+            # The cache is optional (e.g. read-only data folder, or mixed-type
+            # columns pyarrow can't store); drop any partial output
+            for path in (inv_parquet, pay_parquet):
+                for leftover in (path, path + tmp_suffix):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+
+    # Whole-number amount columns are stored in the smallest integer type that
+    # holds them, halving memory traffic without loss. Amounts with cents stay
+    # float64: float32 only keeps ~7 digits, which would round report totals.
+    for col in ("Machine Revenue", "Parts Revenue", "Service Revenue", "Total Amount"):
+        if pd.api.types.is_integer_dtype(df_invoices[col]):
+            df_invoices[col] = pd.to_numeric(df_invoices[col], downcast="integer")
+
+    # Categorical name columns let groupbys hash integer codes instead of strings
+    for col in ("Company Name", "Branch", "Customer ID", "Customer Name"):
+        df_invoices[col] = df_invoices[col].astype("category")
+
+    # Both sheets share one Invoice ID dtype so merges align on the codes
+    invoice_ids = pd.Index(
+        pd.concat([df_invoices["Invoice ID"], df_payments["Invoice ID"]]).dropna().unique()
     )
+    try:
+        invoice_ids = invoice_ids.sort_values()
+    except TypeError:
+        # Mixed numeric/string IDs can't be ordered; keep appearance order
+        pass
+    invoice_id_dtype = pd.CategoricalDtype(invoice_ids)
+    df_invoices["Invoice ID"] = df_invoices["Invoice ID"].astype(invoice_id_dtype)
+    df_payments["Invoice ID"] = df_payments["Invoice ID"].astype(invoice_id_dtype)
+
+    # Rows sorted on the merge key let joins on Invoice ID take pandas' monotonic path
+    df_invoices = df_invoices.sort_values("Invoice ID", kind="stable").reset_index(drop=True)
+    df_payments = df_payments.sort_values("Invoice ID", kind="stable").reset_index(drop=True)
     return df_invoices, df_payments
 
 # Adjust path to your local file
 EXCEL_FILE_PATH = r"exceldata/SVP Sample data with Payments.xlsx"
 df_invoices, df_payments = load_data(EXCEL_FILE_PATH)
 
+
+@st.cache_data
+def get_merged_payments():
+    """
+    Payments joined with the invoice fields every report needs, computed
+    once per data load instead of on every page render.
+    """
+    return df_payments.merge(
+        df_invoices[[
+            "Invoice ID", "Customer Name", "Company Name", "Invoice Date",
+            "Machine Revenue", "Parts Revenue", "Service Revenue"
+        ]],
+        on="Invoice ID",
+        how="left",
+        validate="many_to_one"
+    )
+
+
+@st.cache_data
+def get_date_bounds():
+    """
+    First and last invoice dates, used as the global date filter limits.
+    """
+    return df_invoices["Invoice Date"].min().date(), df_invoices["Invoice Date"].max().date()
+
+
+@st.cache_data
+def get_customer_names():
+    """
+    Sorted customer names for the ledger picker (categories are already unique).
+    """
+    return df_invoices["Customer Name"].cat.categories.tolist()
+
+
+@st.cache_data
+def get_company_names():
+    """
+    Sorted company names for the segment-wise picker.
+    """
+    return df_invoices["Company Name"].cat.categories.tolist()
+
+
 # For global date filters
-min_date = df_invoices["Invoice Date"].min().date()
-max_date = df_invoices["Invoice Date"].max().date()
+min_date, max_date = get_date_bounds()
 
 # --------------------------------------------------------------------------------
 # HELPER FUNCTIONS FOR RECEIVABLES, BANKER, LEDGER
 # --------------------------------------------------------------------------------
 
+def date_range_bounds(from_date, to_date):
+    """
+    Timestamps for filtering datetime columns on an inclusive date range:
+    use `col >= from_ts` and `col < to_ts` (to_ts is the day after to_date).
+    """
+    from_ts = pd.Timestamp(from_date)
+    to_ts = pd.Timestamp(to_date) + pd.Timedelta(days=1)
+    return from_ts, to_ts
+
+
 def create_receivables_report(df_invoices, df_payments, from_date, to_date, group_by):
     """
     Generates Receivables Report with partial payments properly distributed
@@ -49,69 +162,27 @@ def create_receivables_report(df_invoices, df_payments, from_date, to_date, grou
     the sum of Machine OS + Parts OS + Service OS.
     """
     today_date = date.today()
+    today_end = pd.Timestamp(today_date) + pd.Timedelta(days=1)
+    from_ts, to_ts = date_range_bounds(from_date, to_date)
 
     # 1) Sum partial payments up to 'today'
-    df_pay_lim = df_payments[df_payments["Payment Date"].dt.date <= today_date].copy()
-    paid_agg = df_pay_lim.groupby("Invoice ID")["Payment Amount"].sum().rename("PaidToDate")
+    df_pay_lim = df_payments[df_payments["Payment Date"] < today_end]
+    # Invoice ID codes are small contiguous ints, so bincount sums per invoice in one pass
+    pay_ids = df_pay_lim["Invoice ID"]
+    codes = pay_ids.cat.codes.to_numpy()
+    has_id = codes >= 0
+    amounts = np.nan_to_num(df_pay_lim["Payment Amount"].to_numpy(dtype=float)[has_id])
+    paid_agg = pd.Series(
+        np.bincount(codes[has_id], weights=amounts, minlength=len(pay_ids.cat.categories)),
+        index=pd.CategoricalIndex(pay_ids.cat.categories, dtype=pay_ids.dtype, name="Invoice ID"),
+        name="PaidToDate"
+    )
 
-    merged = df_invoices.merge(paid_agg, on="Invoice ID", how="left")
+    merged = df_invoices.merge(paid_agg, on="Invoice ID", how="left", validate="one_to_one")
     merged["PaidToDate"] = merged["PaidToDate"].fillna(0.0)
     merged["Outstanding"] = merged["Total Amount"] - merged["PaidToDate"]
 
-    # 2) Filter by invoice date
-    filtered_df = merged[
-        (merged["Invoice Date"].dt.date >= from_date)
-        & (merged["Invoice Date"].dt.date <= to_date)
-    ].copy()
-
-    # 3) Compute Days Past Due & Aging
-    filtered_df["Days Past Due"] = (
-        pd.to_datetime(today_date) - filtered_df["Due Date"]
-    ).dt.days.fillna(0)
-
-    def aging_bucket(days):
-        if days <= 0:
-            return "Current"
-        elif days <= 30:
-            return "1-30 Days"
-        elif days <= 60:
-            return "31-60 Days"
-        elif days <= 90:
-            return "61-90 Days"
-        else:
-            return "90+ Days"
-
-    filtered_df["Aging Bucket"] = filtered_df["Days Past Due"].apply(aging_bucket)
-
-    # 4) Distribute partial payments proportionally to Machine, Parts, Service
-    def distribute_partial_payments(row):
-        total_inv = row["Total Amount"]
-        paid = row["PaidToDate"]
-        if total_inv <= 0:
-            # Avoid divide-by-zero or negative totals
-            return row["Machine Revenue"], row["Parts Revenue"], row["Service Revenue"]
-        
-        # Proportions of each line item
-        mach_share = row["Machine Revenue"] / total_inv
-        parts_share = row["Parts Revenue"] / total_inv
-        serv_share = row["Service Revenue"] / total_inv
-        
-        # Payment allocated to each line
-        mach_paid = paid * mach_share
-        parts_paid = paid * parts_share
-        serv_paid = paid * serv_share
-        
-        # Outstanding for each line
-        mach_os = row["Machine Revenue"] - mach_paid
-        parts_os = row["Parts Revenue"] - parts_paid
-        serv_os = row["Service Revenue"] - serv_paid
-        return mach_os, parts_os, serv_os
-
-    filtered_df["Machine OS"], filtered_df["Parts OS"], filtered_df["Service OS"] = zip(
-        *filtered_df.apply(distribute_partial_payments, axis=1)
-    )
-
-    # 5) Determine grouping column
+    # 2) Determine grouping column
     if group_by == "Grand Total":
         group_col = None
     elif group_by == "Branch Wise Details":
@@ -119,61 +190,79 @@ def create_receivables_report(df_invoices, df_payments, from_date, to_date, grou
     else:
         group_col = group_by
 
-    # 6) Summation for the 'Total OS'
+    # 3) Filter by invoice date, keeping only the columns used below so the
+    # row selection and the copy made by assign() touch less data
+    keep_cols = ([group_col] if group_col else []) + [
+        "Due Date", "Total Amount", "PaidToDate", "Outstanding",
+        "Machine Revenue", "Parts Revenue", "Service Revenue"
+    ]
+    filtered_df = merged.loc[
+        (merged["Invoice Date"] >= from_ts)
+        & (merged["Invoice Date"] < to_ts),
+        keep_cols
+    ]
+
+    # 4) Compute Days Past Due & Aging
+    days_past_due = (
+        pd.to_datetime(today_date) - filtered_df["Due Date"]
+    ).dt.days.fillna(0)
+
+    aging_labels = ["Current", "1-30 Days", "31-60 Days", "61-90 Days", "90+ Days"]
+    aging_bucket = pd.cut(
+        days_past_due,
+        bins=[-np.inf, 0, 30, 60, 90, np.inf],
+        labels=aging_labels,
+        ordered=True
+    )
+
+    # 5) Distribute partial payments proportionally to Machine, Parts, Service
+    total = filtered_df["Total Amount"].to_numpy(dtype=float)
+    paid = filtered_df["PaidToDate"].to_numpy(dtype=float)
+    # Share of the invoice already paid (0 where total <= 0 to avoid divide-by-zero)
+    paid_ratio = np.divide(paid, total, out=np.zeros_like(total), where=total > 0)
+
+    filtered_df = filtered_df.assign(**{
+        "Days Past Due": days_past_due,
+        "Aging Bucket":  aging_bucket,
+        "Machine OS":    filtered_df["Machine Revenue"].to_numpy() * (1 - paid_ratio),
+        "Parts OS":      filtered_df["Parts Revenue"].to_numpy() * (1 - paid_ratio),
+        "Service OS":    filtered_df["Service Revenue"].to_numpy() * (1 - paid_ratio),
+    })
+
+    # 6) Summation for the 'Total OS' and the line-item OS in one pass
+    os_aggs = {
+        "Total OS":   ("Outstanding", "sum"),
+        "Machine OS": ("Machine OS", "sum"),
+        "Parts OS":   ("Parts OS", "sum"),
+        "Service OS": ("Service OS", "sum"),
+    }
     if group_col:
-        df_total = filtered_df.groupby(group_col)["Outstanding"].sum().rename("Total OS")
+        agg_df = filtered_df.groupby(group_col, observed=True).agg(**os_aggs)
     else:
-        df_total = pd.Series(
-            filtered_df["Outstanding"].sum(),
-            index=["Grand Total"],
-            name="Total OS"
+        agg_df = pd.DataFrame(
+            {name: [filtered_df[col].sum()] for name, (col, _) in os_aggs.items()},
+            index=["Grand Total"]
         )
 
     # 7) Aging pivot
     if group_col:
-        aging_pivot = filtered_df.pivot_table(
-            index=group_col,
-            columns="Aging Bucket",
-            values="Outstanding",
-            aggfunc="sum",
-            fill_value=0
+        aging_pivot = (
+            filtered_df.groupby([group_col, "Aging Bucket"], observed=True)["Outstanding"]
+            .sum()
+            .unstack(fill_value=0)
         )
     else:
         pivot_series = filtered_df.groupby("Aging Bucket")["Outstanding"].sum()
         aging_pivot = pd.DataFrame([pivot_series], index=["Grand Total"])
         aging_pivot.fillna(0, inplace=True)
 
-    for bucket in ["Current", "1-30 Days", "31-60 Days", "61-90 Days", "90+ Days"]:
-        if bucket not in aging_pivot.columns:
-            aging_pivot[bucket] = 0
+    # Buckets with no invoices are dropped by observed=True; add them back as zeros
+    aging_pivot = aging_pivot.reindex(columns=aging_labels, fill_value=0)
 
-    # 8) Summation for the line-item OS
-    if group_col:
-        df_machine = filtered_df.groupby(group_col)["Machine OS"].sum().rename("Machine OS")
-        df_parts   = filtered_df.groupby(group_col)["Parts OS"].sum().rename("Parts OS")
-        df_service = filtered_df.groupby(group_col)["Service OS"].sum().rename("Service OS")
-    else:
-        df_machine = pd.Series(
-            filtered_df["Machine OS"].sum(),
-            index=["Grand Total"],
-            name="Machine OS"
-        )
-        df_parts = pd.Series(
-            filtered_df["Parts OS"].sum(),
-            index=["Grand Total"],
-            name="Parts OS"
-        )
-        df_service = pd.Series(
-            filtered_df["Service OS"].sum(),
-            index=["Grand Total"],
-            name="Service OS"
-        )
-
-    # 9) Combine everything into final_df
-    final_df = pd.DataFrame(df_total).join(aging_pivot, how="left")
-    final_df = final_df.join(df_machine, how="left")
-    final_df = final_df.join(df_parts, how="left")
-    final_df = final_df.join(df_service, how="left")
+    # 8) Combine everything into final_df
+    # Both pieces share the same group index, so a single concat aligns them.
+    # observed=True groupbys keep appearance order on older pandas, so sort here.
+    final_df = pd.concat([agg_df, aging_pivot], axis=1).sort_index()
     final_df.reset_index(inplace=True)
 
     # Rename grouping column to 'Group'
@@ -184,7 +273,7 @@ def create_receivables_report(df_invoices, df_payments, from_date, to_date, grou
         col_name = "Branch" if group_by == "Branch Wise Details" else group_by
         final_df.rename(columns={col_name: "Group"}, inplace=True)
 
-    # 10) Final column order
+    # 9) Final column order
     col_order = [
         "Group",
         "Total OS",
@@ -202,51 +291,47 @@ def create_receivables_report(df_invoices, df_payments, from_date, to_date, grou
     return final_df
 
 
-def create_banker_report(df_invoices, df_payments, from_date, to_date):
+def create_banker_report(df_invoices, dfp_merged, from_date, to_date):
     """
     Banker report using partial payments as credits.
+    dfp_merged is payments joined with their invoices (see get_merged_payments()).
     """
-    dfp_merged = df_payments.merge(
-        df_invoices[["Invoice ID", "Customer Name"]],
-        on="Invoice ID",
-        how="left"
-    )
-
-    df_inv_before = df_invoices[df_invoices["Invoice Date"].dt.date < from_date]
-    df_pay_before = dfp_merged[dfp_merged["Payment Date"].dt.date < from_date]
-
-    df_inv_range = df_invoices[
-        (df_invoices["Invoice Date"].dt.date >= from_date)
-        & (df_invoices["Invoice Date"].dt.date <= to_date)
-    ]
-    df_pay_range = dfp_merged[
-        (dfp_merged["Payment Date"].dt.date >= from_date)
-        & (dfp_merged["Payment Date"].dt.date <= to_date)
-    ]
-
-    inv_before_agg = df_inv_before.groupby("Customer Name")["Total Amount"].sum().rename("InvBefore")
-    pay_before_agg = df_pay_before.groupby("Customer Name")["Payment Amount"].sum().rename("PayBefore")
-
-    inv_range_agg = df_inv_range.groupby("Customer Name")["Total Amount"].sum().rename("InvRange")
-    pay_range_agg = df_pay_range.groupby("Customer Name")["Payment Amount"].sum().rename("PayRange")
+    from_ts, to_ts = date_range_bounds(from_date, to_date)
+
+    def period_sums(df, date_col, amount_col):
+        """
+        Per-customer totals before the range and within it, from one groupby.
+        Rows after the range are dropped so they don't add empty customers.
+        """
+        dates = df[date_col]
+        period = np.where(dates < from_ts, "Before", np.where(dates < to_ts, "Range", "After"))
+        in_scope = period != "After"
+        return (
+            df[in_scope]
+            .groupby(["Customer Name", period[in_scope]], observed=True)[amount_col]
+            .sum()
+            .unstack(fill_value=0.0)
+            .reindex(columns=["Before", "Range"], fill_value=0.0)
+        )
 
-    all_cust = set(inv_before_agg.index).union(
-        pay_before_agg.index, inv_range_agg.index, pay_range_agg.index
-    )
-    all_cust = sorted(all_cust)
+    inv_sums = period_sums(df_invoices, "Invoice Date", "Total Amount")
+    pay_sums = period_sums(dfp_merged, "Payment Date", "Payment Amount")
 
-    banker_df = pd.DataFrame(index=all_cust)
-    banker_df["Opening (Invoices)"] = inv_before_agg
-    banker_df["Opening (Payments)"] = pay_before_agg
-    banker_df["Debits (Invoices)"]  = inv_range_agg
-    banker_df["Credits (Payments)"] = pay_range_agg
-    banker_df.fillna(0.0, inplace=True)
+    banker_df = pd.concat(
+        {
+            "Opening (Invoices)": inv_sums["Before"],
+            "Opening (Payments)": pay_sums["Before"],
+            "Debits (Invoices)":  inv_sums["Range"],
+            "Credits (Payments)": pay_sums["Range"],
+        },
+        axis=1
+    ).fillna(0.0).sort_index()
 
     banker_df["Opening Balance"] = banker_df["Opening (Invoices)"] - banker_df["Opening (Payments)"]
     banker_df["Balance"] = banker_df["Opening Balance"] + banker_df["Debits (Invoices)"] - banker_df["Credits (Payments)"]
 
+    banker_df.index.name = "Customer Name"
     banker_df.reset_index(inplace=True)
-    banker_df.rename(columns={"index": "Customer Name"}, inplace=True)
 
     col_order = [
         "Customer Name",
@@ -259,69 +344,56 @@ def create_banker_report(df_invoices, df_payments, from_date, to_date):
     return banker_df
 
 
-def create_customer_ledger(df_invoices, df_payments, from_date, to_date, customer_name):
+def create_customer_ledger(df_invoices, dfp_merged, from_date, to_date, customer_name):
     """
     True ledger with invoice lines as Debits & payment lines as Credits.
+    dfp_merged is payments joined with their invoices (see get_merged_payments()).
     """
-    dfp_merged = df_payments.merge(
-        df_invoices[["Invoice ID", "Customer Name"]],
-        on="Invoice ID",
-        how="left"
-    )
+    from_ts, to_ts = date_range_bounds(from_date, to_date)
 
     df_inv = df_invoices[
         (df_invoices["Customer Name"] == customer_name)
-        & (df_invoices["Invoice Date"].dt.date >= from_date)
-        & (df_invoices["Invoice Date"].dt.date <= to_date)
+        & (df_invoices["Invoice Date"] >= from_ts)
+        & (df_invoices["Invoice Date"] < to_ts)
     ]
 
     df_pay_cust = dfp_merged[
         (dfp_merged["Customer Name"] == customer_name)
-        & (dfp_merged["Payment Date"].dt.date >= from_date)
-        & (dfp_merged["Payment Date"].dt.date <= to_date)
+        & (dfp_merged["Payment Date"] >= from_ts)
+        & (dfp_merged["Payment Date"] < to_ts)
     ]
 
-    ledger_rows = []
-
     # Invoices => Debits
-    for _, row in df_inv.iterrows():
-        ledger_rows.append({
-            "Date": row["Invoice Date"],
-            "Txn Type": f"Invoice {row['Invoice ID']}",
-            "Debits": row["Total Amount"],
-            "Credits": 0.0
-        })
+    debits = pd.DataFrame({
+        "Date": df_inv["Invoice Date"].to_numpy(),
+        "Txn Type": "Invoice " + df_inv["Invoice ID"].astype(str).to_numpy(),
+        "Debits": df_inv["Total Amount"].to_numpy(dtype=float),
+        "Credits": 0.0
+    })
 
     # Payments => Credits
-    for _, row in df_pay_cust.iterrows():
-        ledger_rows.append({
-            "Date": row["Payment Date"],
-            "Txn Type": f"Payment {row['Payment ID']}",
-            "Debits": 0.0,
-            "Credits": row["Payment Amount"]
-        })
+    credits = pd.DataFrame({
+        "Date": df_pay_cust["Payment Date"].to_numpy(),
+        "Txn Type": "Payment " + df_pay_cust["Payment ID"].astype(str).to_numpy(),
+        "Debits": 0.0,
+        "Credits": df_pay_cust["Payment Amount"].to_numpy(dtype=float)
+    })
 
-    ledger_df = pd.DataFrame(ledger_rows)
-    ledger_df.sort_values(by="Date", inplace=True)
+    ledger_df = pd.concat([debits, credits], ignore_index=True)
+    ledger_df.sort_values(by="Date", kind="stable", inplace=True)
 
     df_inv_before = df_invoices[
         (df_invoices["Customer Name"] == customer_name)
-        & (df_invoices["Invoice Date"].dt.date < from_date)
+        & (df_invoices["Invoice Date"] < from_ts)
     ]["Total Amount"].sum()
 
     df_pay_before = dfp_merged[
         (dfp_merged["Customer Name"] == customer_name)
-        & (dfp_merged["Payment Date"].dt.date < from_date)
+        & (dfp_merged["Payment Date"] < from_ts)
     ]["Payment Amount"].sum()
 
     opening_balance = df_inv_before - df_pay_before
-    running_balance = []
-    current = opening_balance
-    for i, row in ledger_df.iterrows():
-        current = current + row["Debits"] - row["Credits"]
-        running_balance.append(current)
-
-    ledger_df["Running Balance"] = running_balance
+    ledger_df["Running Balance"] = opening_balance + (ledger_df["Debits"] - ledger_df["Credits"]).cumsum()
     ledger_df["Date"] = ledger_df["Date"].dt.strftime("%d/%m/%Y")
 
     ledger_df = ledger_df[["Date", "Txn Type", "Debits", "Credits", "Running Balance"]]
@@ -336,27 +408,43 @@ def plot_aging_distribution(final_df):
     if not all(col in final_df.columns for col in aging_cols):
         return
     sums = final_df[aging_cols].sum()
-    fig, ax = plt.subplots()
-    ax.bar(sums.index, sums.values)
-    ax.set_title("Aging Distribution")
-    ax.set_ylabel("Amount")
-    st.pyplot(fig)
+    st.subheader("Aging Distribution")
+    st.bar_chart(sums.rename("Amount"))
 
 # --------------------------------------------------------------------------------
 # SEGMENT WISE FUNCTION
 # --------------------------------------------------------------------------------
-def create_segment_wise_report(df_invoices, df_payments, company="All Companies"):
+@numba.njit(cache=True)
+def segment_alloc(pay, mach, parts, serv, pay_bucket_id, inv_bucket_id, n_buckets):
+    """
+    Splits each payment across Machine/Parts/Service in proportion to its
+    invoice's revenue lines and sums the shares per payment bucket, in a
+    single pass. Payments outside a bucket (id -1), whose invoice is in a
+    different bucket, or whose invoice total is not positive are skipped.
+    Returns an (n_buckets, 3) array of Machine, Parts, Service totals.
+    """
+    out = np.zeros((n_buckets, 3))
+    for i in range(pay.shape[0]):
+        b = pay_bucket_id[i]
+        if b < 0 or b != inv_bucket_id[i]:
+            continue
+        inv_sum = mach[i] + parts[i] + serv[i]
+        if inv_sum > 0:
+            ratio = pay[i] / inv_sum
+            out[b, 0] += mach[i] * ratio
+            out[b, 1] += parts[i] * ratio
+            out[b, 2] += serv[i] * ratio
+    return out
+
+
+def create_segment_wise_report(df_invoices, dfp_merged, company="All Companies"):
     """
     Partial payment logic with multi-bucket approach for segment wise.
+    dfp_merged is payments joined with their invoices (see get_merged_payments()).
     """
     if company != "All Companies":
-        df_invoices = df_invoices[df_invoices["Company Name"] == company].copy()
-
-    dfp_merged = df_payments.merge(
-        df_invoices[["Invoice ID", "Invoice Date", "Machine Revenue", "Parts Revenue", "Service Revenue"]],
-        on="Invoice ID",
-        how="left"
-    )
+        df_invoices = df_invoices[df_invoices["Company Name"] == company]
+        dfp_merged = dfp_merged[dfp_merged["Company Name"] == company]
 
     time_buckets = [
         ("Older Years",   date(1900,1,1),  date(2023,3,31)),
@@ -376,64 +464,71 @@ def create_segment_wise_report(df_invoices, df_payments, company="All Companies"
         row_tuples.append((seg, "Balance OS"))
     col_labels = [tb[0] for tb in time_buckets]
     index = pd.MultiIndex.from_tuples(row_tuples, names=["Segment", "Line"])
-    seg_df = pd.DataFrame(index=index, columns=col_labels, data=0.0)
-
-    for (col_label, start_d, end_d) in time_buckets:
-        df_inv_range = df_invoices[
-            (df_invoices["Invoice Date"].dt.date >= start_d)
-            & (df_invoices["Invoice Date"].dt.date <= end_d)
-        ]
-
-        machine_os = df_inv_range["Machine Revenue"].sum()
-        parts_os   = df_inv_range["Parts Revenue"].sum()
-        service_os = df_inv_range["Service Revenue"].sum()
-
-        df_pay_range = dfp_merged[
-            (dfp_merged["Invoice Date"].dt.date >= start_d)
-            & (dfp_merged["Invoice Date"].dt.date <= end_d)
-            & (dfp_merged["Payment Date"].dt.date >= start_d)
-            & (dfp_merged["Payment Date"].dt.date <= end_d)
-        ]
-
-        machine_pay_total = 0.0
-        parts_pay_total   = 0.0
-        service_pay_total = 0.0
-
-        for _, row2 in df_pay_range.iterrows():
-            inv_mach  = row2.get("Machine Revenue", 0.0)
-            inv_parts = row2.get("Parts Revenue", 0.0)
-            inv_serv  = row2.get("Service Revenue", 0.0)
-            inv_sum   = inv_mach + inv_parts + inv_serv
-            pay_amt   = row2["Payment Amount"]
-
-            if inv_sum > 0:
-                mach_share   = pay_amt * (inv_mach / inv_sum)
-                parts_share  = pay_amt * (inv_parts / inv_sum)
-                serv_share   = pay_amt * (inv_serv / inv_sum)
-            else:
-                mach_share = parts_share = serv_share = 0.0
-
-            machine_pay_total += mach_share
-            parts_pay_total   += parts_share
-            service_pay_total += serv_share
-
-        seg_df.loc[("Machine", "Outstanding as on Date"), col_label] = machine_os
-        seg_df.loc[("Machine", "Less: Payment Received"), col_label] = machine_pay_total
-        seg_df.loc[("Machine", "Balance OS"), col_label] = machine_os - machine_pay_total
-
-        seg_df.loc[("Parts", "Outstanding as on Date"), col_label] = parts_os
-        seg_df.loc[("Parts", "Less: Payment Received"), col_label] = parts_pay_total
-        seg_df.loc[("Parts", "Balance OS"), col_label] = parts_os - parts_pay_total
-
-        seg_df.loc[("Service", "Outstanding as on Date"), col_label] = service_os
-        seg_df.loc[("Service", "Less: Payment Received"), col_label] = service_pay_total
-        seg_df.loc[("Service", "Balance OS"), col_label] = service_os - service_pay_total
+
+    # Buckets are contiguous, so their start dates (plus the day after the last
+    # end date) form the bin edges; right=False keeps each end date inclusive.
+    bucket_edges = [pd.Timestamp(start_d) for (_, start_d, _) in time_buckets]
+    bucket_edges.append(pd.Timestamp(time_buckets[-1][2]) + pd.Timedelta(days=1))
+
+    def assign_bucket(dates):
+        return pd.cut(dates, bins=bucket_edges, labels=col_labels, right=False)
+
+    # Invoice totals per bucket
+    inv_totals = df_invoices.groupby(
+        assign_bucket(df_invoices["Invoice Date"]), observed=False
+    )[["Machine Revenue", "Parts Revenue", "Service Revenue"]].sum()
+
+    # Payments are split across segments in proportion to the invoice's revenue
+    # lines, counting only payments whose invoice falls in the same bucket.
+    pay_totals = segment_alloc(
+        dfp_merged["Payment Amount"].to_numpy(dtype=float),
+        dfp_merged["Machine Revenue"].to_numpy(dtype=float),
+        dfp_merged["Parts Revenue"].to_numpy(dtype=float),
+        dfp_merged["Service Revenue"].to_numpy(dtype=float),
+        assign_bucket(dfp_merged["Payment Date"]).cat.codes.to_numpy(),
+        assign_bucket(dfp_merged["Invoice Date"]).cat.codes.to_numpy(),
+        len(col_labels)
+    )
+
+    # Lay out (segment, line, bucket) values to match row_tuples, then build
+    # seg_df in one go rather than assigning cell by cell.
+    seg_os   = inv_totals.to_numpy(dtype=float).T
+    seg_paid = pay_totals.T
+    vals = np.stack([seg_os, seg_paid, seg_os - seg_paid], axis=1).reshape(len(row_tuples), len(col_labels))
+    seg_df = pd.DataFrame(vals, index=index, columns=col_labels)
 
     return seg_df
 
 # --------------------------------------------------------------------------------
 # PAGE FUNCTIONS
 # --------------------------------------------------------------------------------
+def excel_bytes(df, sheet_name, index=False):
+    """
+    Writes df to an in-memory .xlsx with the xlsxwriter engine for download.
+    constant_memory is left off: pandas writes cells column by column, which
+    that mode cannot handle (it only keeps the current row).
+    """
+    output = io.BytesIO()
+    with pd.ExcelWriter(
+        output,
+        engine="xlsxwriter",
+        engine_kwargs={"options": {"strings_to_formulas": False, "strings_to_urls": False}}
+    ) as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=index)
+    return output.getvalue()
+
+
+def number_column_config(df):
+    """
+    Streamlit column_config showing every numeric column of df with two
+    decimals; formatting happens client-side instead of via a pandas Styler.
+    """
+    return {
+        col: st.column_config.NumberColumn(format="%.2f")
+        for col in df.select_dtypes("number").columns
+    }
+
+
 def show_receivables_report():
     st.title("Receivables Report")
 
@@ -447,14 +542,11 @@ def show_receivables_report():
         col1, col2 = st.columns(2)
         col1.metric("Total Outstanding", f"{total_os:,.2f}")
 
-        st.dataframe(final_df.style.format(precision=2))
+        st.dataframe(final_df, column_config=number_column_config(final_df))
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            final_df.to_excel(writer, sheet_name="Receivables", index=False)
         st.download_button(
             "Download Excel",
-            data=output.getvalue(),
+            data=excel_bytes(final_df, "Receivables"),
             file_name="Receivables_Report.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -466,15 +558,12 @@ def show_banker_report():
     to_dt   = st.session_state["to_date"]
 
     if st.button("Generate Banker Report"):
-        banker_df = create_banker_report(df_invoices, df_payments, from_dt, to_dt)
-        st.dataframe(banker_df.style.format(precision=2))
+        banker_df = create_banker_report(df_invoices, get_merged_payments(), from_dt, to_dt)
+        st.dataframe(banker_df, column_config=number_column_config(banker_df))
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            banker_df.to_excel(writer, sheet_name="Banker Report", index=False)
         st.download_button(
             "Download Excel",
-            data=output.getvalue(),
+            data=excel_bytes(banker_df, "Banker Report"),
             file_name="Banker_Report.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -485,19 +574,16 @@ def show_customer_ledger():
     from_dt = st.session_state["from_date"]
     to_dt   = st.session_state["to_date"]
 
-    all_cust = sorted(df_invoices["Customer Name"].dropna().unique())
+    all_cust = get_customer_names()
     chosen_cust = st.selectbox("Select Customer:", all_cust, index=0)
 
     if st.button("Generate Customer Ledger"):
-        ledger_df = create_customer_ledger(df_invoices, df_payments, from_dt, to_dt, chosen_cust)
-        st.dataframe(ledger_df.style.format(precision=2))
+        ledger_df = create_customer_ledger(df_invoices, get_merged_payments(), from_dt, to_dt, chosen_cust)
+        st.dataframe(ledger_df, column_config=number_column_config(ledger_df))
 
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            ledger_df.to_excel(writer, sheet_name="Customer Ledger", index=False)
         st.download_button(
             "Download Excel",
-            data=output.getvalue(),
+            data=excel_bytes(ledger_df, "Customer Ledger"),
             file_name="Customer_Ledger.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -507,25 +593,27 @@ def show_segment_wise():
     st.title("Segment Wise Outstanding & Payment")
 
     # Let user pick company
-    companies = ["All Companies"] + sorted(df_invoices["Company Name"].dropna().unique())
+    companies = ["All Companies"] + get_company_names()
     chosen_company = st.selectbox("Select Company:", companies, index=0)
 
     if st.button("Generate Segment-Wise Report"):
-        seg_df = create_segment_wise_report(df_invoices, df_payments, chosen_company)
+        seg_df = create_segment_wise_report(df_invoices, get_merged_payments(), chosen_company)
 
         # -- STYLING CHANGES HERE --
-        def highlight_balance(row):
+        def highlight_balance(df):
             """
-            If row is for 'Balance OS', highlight that row and make it bold.
+            Highlight the 'Balance OS' rows and make them bold, building the
+            whole style table in one call instead of one call per row.
             """
-            if row.name[1] == "Balance OS":
-                return ["font-weight: bold; background-color: #FFFACD;" for _ in row]
-            else:
-                return ["" for _ in row]
+            styles = pd.DataFrame("", index=df.index, columns=df.columns)
+            is_balance = df.index.get_level_values("Line") == "Balance OS"
+            styles.loc[is_balance, :] = "font-weight: bold; background-color: #FFFACD;"
+            return styles
 
+        # Styled copy is for display only; the download below uses the raw seg_df
         styled_df = seg_df.style \
             .format(precision=2) \
-            .apply(highlight_balance, axis=1) \
+            .apply(highlight_balance, axis=None) \
             .set_table_styles([
                 {
                     "selector": "th",
@@ -541,12 +629,9 @@ def show_segment_wise():
         st.dataframe(styled_df, use_container_width=True)
 
         # Provide Excel download
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            seg_df.to_excel(writer, sheet_name="SegmentWise", index=True)
         st.download_button(
             label="Download Excel",
-            data=output.getvalue(),
+            data=excel_bytes(seg_df, "SegmentWise", index=True),
             file_name="SegmentWise_Report.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -565,21 +650,17 @@ def show_management_dashboard():
     c2.metric("Total Paid",     f"{total_pay:,.2f}")
     c3.metric("Outstanding",    f"{total_os:,.2f}")
 
-    dfp_merged = df_payments.merge(
-        df_invoices[["Invoice ID", "Company Name", "Customer Name"]],
-        on="Invoice ID",
-        how="left"
-    )
+    dfp_merged = get_merged_payments()
 
-    inv_company = df_invoices.groupby("Company Name")["Total Amount"].sum().rename("InvTotal")
-    pay_company = dfp_merged.groupby("Company Name")["Payment Amount"].sum().rename("PayTotal")
-    mg = pd.DataFrame(inv_company).join(pay_company, how="outer").fillna(0)
+    inv_company = df_invoices.groupby("Company Name", observed=True)["Total Amount"].sum().rename("InvTotal")
+    pay_company = dfp_merged.groupby("Company Name", observed=True)["Payment Amount"].sum().rename("PayTotal")
+    mg = pd.DataFrame(inv_company).join(pay_company, how="outer").fillna(0).sort_index()
     mg["Outstanding"] = mg["InvTotal"] - mg["PayTotal"]
     st.subheader("Total Outstanding by Company")
     st.bar_chart(data=mg.reset_index(), x="Company Name", y="Outstanding")
 
-    inv_cust = df_invoices.groupby("Customer Name")["Total Amount"].sum().rename("InvTotal")
-    pay_cust = dfp_merged.groupby("Customer Name")["Payment Amount"].sum().rename("PayTotal")
+    inv_cust = df_invoices.groupby("Customer Name", observed=True)["Total Amount"].sum().rename("InvTotal")
+    pay_cust = dfp_merged.groupby("Customer Name", observed=True)["Payment Amount"].sum().rename("PayTotal")
     mg2 = pd.DataFrame(inv_cust).join(pay_cust, how="outer").fillna(0)
     mg2["Outstanding"] = mg2["InvTotal"] - mg2["PayTotal"]
     mg2_sorted = mg2.sort_values("Outstanding", ascending=False).head(5)